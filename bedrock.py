@@ -1,11 +1,25 @@
-import boto3
+import logging
+from clients import get_client
+
+logger = logging.getLogger(__name__)
+# Stay silent unless the application configures logging
+logger.addHandler(logging.NullHandler())
+
+# Foundation models listed per region; the list doesn't change during a run
+_foundation_models = {}
 
 class Bedrock:
     def __init__(self, region="us-east-1"):
-        self.bedrock = boto3.client(service_name="bedrock", region_name=region)
+        self.bedrock = get_client("bedrock", region)
         self.region = region
 
-    def foundation_models(self):
+    def fetch_foundation_models(self):
+        # Returns (models, error message) rather than logging, so callers that hold the
+        # terminal (e.g. a curses menu) can report the failure once they've let it go
+        from botocore.exceptions import EndpointConnectionError
+
+        if self.region in _foundation_models:
+            return list(_foundation_models[self.region]), None
         try:
             response = self.bedrock.list_foundation_models(
                 byInferenceType='ON_DEMAND'
@@ -17,10 +31,15 @@ class Bedrock:
                     'value': model.get('modelArn', ''),
                     'groupName': model.get('providerName', '')
                 })
-            return model_list
-        except botocore.exceptions.EndpointConnectionError:
-            print(f"\nSorry, Bedrock is not available in the {self.region} region.")
-            return None
+            _foundation_models[self.region] = model_list
+            return list(model_list), None
+        except EndpointConnectionError:
+            return None, f"Sorry, Bedrock is not available in the {self.region} region."
         except Exception as e:
-            print(f"\nAn error occurred while fetching Bedrock models: {str(e)}")
-            return None
\ No newline at end of file
+            return None, f"An error occurred while fetching Bedrock models: {str(e)}"
+
+    def foundation_models(self):
+        model_list, error = self.fetch_foundation_models()
+        if error:
+            logger.error(error)
+        return model_list
@@ -0,0 +1,32 @@
+import threading
+from functools import lru_cache
+
+_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _session():
+    # boto3 takes a noticeable time to import, so only load it once a client is needed
+    import boto3
+    return boto3.session.Session()
+
+@lru_cache(maxsize=1)
+def _config():
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=50,
+        retries={'max_attempts': 10, 'mode': 'adaptive'},
+        tcp_keepalive=True
+    )
+
+@lru_cache(maxsize=None)
+def get_client(service_name, region=None):
+    # Sessions are not thread-safe, so serialize client creation
+    with _lock:
+        return _session().client(service_name, region_name=region, config=_config())
+
+@lru_cache(maxsize=1)
+def get_caller_identity():
+    return get_client('sts').get_caller_identity()
+
+def get_account_id():
+    return get_caller_identity()['Account']
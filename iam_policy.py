@@ -1,146 +1,231 @@
-import boto3
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import chain
+from clients import get_account_id, get_client
+
+logger = logging.getLogger(__name__)
+# Stay silent unless the application configures logging
+logger.addHandler(logging.NullHandler())
+
+# Process-wide cache of GetPolicy results, keyed by policy ARN
+POLICY_CACHE_TTL = 60
+POLICY_CACHE_SIZE = 1024
+_policy_cache = {}
+_policy_cache_lock = threading.Lock()
+
+def _cache_policy(arn, policy):
+    with _policy_cache_lock:
+        _policy_cache.pop(arn, None)
+        if len(_policy_cache) >= POLICY_CACHE_SIZE:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            del _policy_cache[next(iter(_policy_cache))]
+        _policy_cache[arn] = (time.monotonic(), policy)
+
+def _cached_policy(arn):
+    with _policy_cache_lock:
+        entry = _policy_cache.get(arn)
+    if entry and time.monotonic() - entry[0] < POLICY_CACHE_TTL:
+        return entry[1]
+    return None
+
+def _invalidate_policy(arn):
+    with _policy_cache_lock:
+        _policy_cache.pop(arn, None)
+
+def _parse_document(policy_document):
+    if isinstance(policy_document, str):
+        return json.loads(policy_document)
+    return policy_document
+
+def _serialize_document(policy_document):
+    # Documents may be passed as dicts; serialize them once, compactly, for the IAM call
+    if isinstance(policy_document, str):
+        return policy_document
+    return json.dumps(policy_document, separators=(',', ':'))
+
+def _document_digest(policy_document):
+    canonical = json.dumps(_parse_document(policy_document), sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
 class IAMPolicy:
     def __init__(self, policy_name, policy_document=None, description=None):
         self.policy_name = policy_name
-        self.iam_client = boto3.client('iam')
-        self.account_id = boto3.client('sts').get_caller_identity().get('Account')
+        self.iam_client = get_client('iam')
+        self.account_id = get_account_id()
+        self._default_document = None  # (version ID, document) once fetched
         self.policy = self._get_policy()
 
         if self.policy is None and policy_document:
-            self.create(policy_document, description)
+            self._create_unchecked(policy_document, description)
+
+    @classmethod
+    def from_dict(cls, policy):
+        # Build an instance from policy metadata we already have, skipping GetPolicy
+        instance = cls.__new__(cls)
+        instance.policy_name = policy['PolicyName']
+        instance.iam_client = get_client('iam')
+        instance.account_id = get_account_id()
+        instance._default_document = None
+        instance.policy = policy
+        _cache_policy(policy['Arn'], policy)
+        return instance
+
+    def _policy_arn(self):
+        return f"arn:aws:iam::{self.account_id}:policy/{self.policy_name}"
 
     def _get_policy(self):
+        arn = self._policy_arn()
+        policy = _cached_policy(arn)
+        if policy is not None:
+            return policy
         try:
-            response = self.iam_client.get_policy(PolicyArn=f"arn:aws:iam::{self.account_id}:policy/{self.policy_name}")
-            return response['Policy']
+            response = self.iam_client.get_policy(PolicyArn=arn)
         except self.iam_client.exceptions.NoSuchEntityException:
             return None
+        _cache_policy(arn, response['Policy'])
+        return response['Policy']
 
     def create(self, policy_document, description=None):
         if self.policy is None:
-            try:
-                params = {
-                    'PolicyName': self.policy_name,
-                    'PolicyDocument': policy_document
-                }
-                if description:
-                    params['Description'] = description
+            self._create_unchecked(policy_document, description)
+        else:
+            logger.warning("Policy %s already exists.", self.policy_name)
 
-                print(f"Creating policy {self.policy_name} with document: {policy_document}")
+    def _create_unchecked(self, policy_document, description=None):
+        # Callers must have already checked that the policy doesn't exist
+        try:
+            params = {
+                'PolicyName': self.policy_name,
+                'PolicyDocument': _serialize_document(policy_document)
+            }
+            if description:
+                params['Description'] = description
 
-                response = self.iam_client.create_policy(**params)
-                self.policy = response['Policy']
-                print(f"Policy {self.policy_name} created successfully.")
-            except Exception as e:
-                print(f"Error creating policy {self.policy_name}: {str(e)}")
-        else:
-            print(f"Policy {self.policy_name} already exists.")
+            logger.debug("Creating policy %s with document: %s", self.policy_name, policy_document)
+
+            response = self.iam_client.create_policy(**params)
+            self.policy = response['Policy']
+            _cache_policy(self.policy['Arn'], self.policy)
+            self._default_document = (self.policy['DefaultVersionId'], _parse_document(policy_document))
+            logger.info("Policy %s created successfully.", self.policy_name)
+        except self.iam_client.exceptions.ClientError as e:
+            logger.error("Error creating policy %s: %s", self.policy_name, e, exc_info=True)
 
     def read(self):
         if self.policy:
             return self.policy
         else:
-            print(f"Policy {self.policy_name} does not exist.")
+            logger.warning("Policy %s does not exist.", self.policy_name)
             return None
 
+    def _get_default_document(self):
+        version_id = self.policy['DefaultVersionId']
+        if self._default_document is None or self._default_document[0] != version_id:
+            policy_version = self.iam_client.get_policy_version(
+                PolicyArn=self.policy['Arn'],
+                VersionId=version_id
+            )['PolicyVersion']
+            self._default_document = (version_id, policy_version['Document'])
+        return self._default_document[1]
+
     def update(self, policy_document):
         if self.policy:
             try:
+                # IAM keeps at most five versions, so don't spend one on an identical document
+                if _document_digest(policy_document) == _document_digest(self._get_default_document()):
+                    logger.info("Policy %s is already up to date.", self.policy_name)
+                    return
+
                 response = self.iam_client.create_policy_version(
                     PolicyArn=self.policy['Arn'],
-                    PolicyDocument=policy_document,
+                    PolicyDocument=_serialize_document(policy_document),
                     SetAsDefault=True
                 )
-                self.policy = self._get_policy()  # Refresh policy info
-                print(f"Policy {self.policy_name} updated successfully.")
-            except Exception as e:
-                print(f"Error updating policy {self.policy_name}: {str(e)}")
+                # Only the default version changed, so refresh the metadata locally
+                version = response['PolicyVersion']
+                self.policy = {
+                    **self.policy,
+                    'DefaultVersionId': version['VersionId'],
+                    'UpdateDate': version['CreateDate']
+                }
+                _cache_policy(self.policy['Arn'], self.policy)
+                self._default_document = (version['VersionId'], _parse_document(policy_document))
+                logger.info("Policy %s updated successfully.", self.policy_name)
+            except self.iam_client.exceptions.ClientError as e:
+                logger.error("Error updating policy %s: %s", self.policy_name, e, exc_info=True)
         else:
-            print(f"Policy {self.policy_name} does not exist.")
+            logger.warning("Policy %s does not exist.", self.policy_name)
 
     def delete(self):
         if self.policy:
             try:
                 # Delete all non-default versions first
-                versions = self.iam_client.list_policy_versions(PolicyArn=self.policy['Arn'])['Versions']
-                for version in versions:
-                    if not version['IsDefaultVersion']:
-                        self.iam_client.delete_policy_version(
+                pages = self.iam_client.get_paginator('list_policy_versions').paginate(
+                    PolicyArn=self.policy['Arn'],
+                    PaginationConfig={'PageSize': 1000}
+                )
+                version_ids = [
+                    version['VersionId']
+                    for version in chain.from_iterable(page['Versions'] for page in pages)
+                    if not version['IsDefaultVersion']
+                ]
+                with ThreadPoolExecutor(max_workers=10) as executor:
+                    list(executor.map(
+                        lambda version_id: self.iam_client.delete_policy_version(
                             PolicyArn=self.policy['Arn'],
-                            VersionId=version['VersionId']
-                        )
-                
+                            VersionId=version_id
+                        ),
+                        version_ids
+                    ))
+
                 # Now delete the policy
                 self.iam_client.delete_policy(PolicyArn=self.policy['Arn'])
+                _invalidate_policy(self.policy['Arn'])
                 self.policy = None
-                print(f"Policy {self.policy_name} deleted successfully.")
+                logger.info("Policy %s deleted successfully.", self.policy_name)
                 return True
-            except Exception as e:
-                print(f"Error deleting policy {self.policy_name}: {str(e)}")
+            except self.iam_client.exceptions.ClientError as e:
+                logger.error("Error deleting policy %s: %s", self.policy_name, e, exc_info=True)
                 return False
         else:
-            print(f"Policy {self.policy_name} does not exist.")
+            logger.warning("Policy %s does not exist.", self.policy_name)
             return True  # Consider it deleted if it doesn't exist
 
+    def _summary_lines(self, policy_document, current_time):
+        for statement in policy_document.get('Statement', []):
+            effect = statement.get('Effect', '').upper()
+            action = ', '.join(statement.get('Action', [])) if isinstance(statement.get('Action'), list) else statement.get('Action', '')
+            resources = statement.get('Resource', [])
+            if not isinstance(resources, list):
+                resources = [resources]
+
+            yield f"{effect}: {action}"
+            for resource in resources:
+                yield f"- {resource}"
+
+            condition = statement.get('Condition', {})
+            date_less_than = condition.get('DateLessThan', {}).get('aws:CurrentTime')
+            if date_less_than:
+                expiration_time = datetime.fromisoformat(date_less_than.replace('Z', '+00:00'))
+                if expiration_time > current_time:
+                    time_left = expiration_time - current_time
+                    hours_left, remainder = divmod(time_left.total_seconds(), 3600)
+                    minutes_left = remainder // 60
+                    yield f"🕒 Expires in {int(hours_left)} hours and {int(minutes_left)} minutes."
+                else:
+                    yield "EXPIRED"
+
     def summary(self):
         if self.policy:
             try:
-                policy_version = self.iam_client.get_policy_version(
-                    PolicyArn=self.policy['Arn'],
-                    VersionId=self.policy['DefaultVersionId']
-                )['PolicyVersion']
-                
-                policy_document = policy_version['Document']
-                summary = []
-
-                for statement in policy_document.get('Statement', []):
-                    effect = statement.get('Effect', '').upper()
-                    action = ', '.join(statement.get('Action', [])) if isinstance(statement.get('Action'), list) else statement.get('Action', '')
-                    resources = statement.get('Resource', [])
-                    if not isinstance(resources, list):
-                        resources = [resources]
-
-                    summary.append(f"{effect}: {action}")
-                    for resource in resources:
-                        summary.append(f"- {resource}")
-
-                    condition = statement.get('Condition', {})
-                    date_less_than = condition.get('DateLessThan', {}).get('aws:CurrentTime')
-                    if date_less_than:
-                        expiration_time = datetime.strptime(date_less_than, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-                        current_time = datetime.now(timezone.utc)
-                        if expiration_time > current_time:
-                            time_left = expiration_time - current_time
-                            hours_left, remainder = divmod(time_left.total_seconds(), 3600)
-                            minutes_left = remainder // 60
-                            summary.append(f"🕒 Expires in {int(hours_left)} hours and {int(minutes_left)} minutes.")
-                        else:
-                            summary.append("EXPIRED")
-
-                return f"{self.policy_name}\n" + "\n".join(summary) + "\n"
+                lines = self._summary_lines(self._get_default_document(), datetime.now(timezone.utc))
+                return f"{self.policy_name}\n" + "\n".join(lines) + "\n"
             except Exception as e:
                 return f"Error retrieving policy summary: {str(e)}"
         else:
             return f"Policy {self.policy_name} does not exist."
-
-    def delete_all_policies(self):
-        policies_to_delete = self.policies.copy()
-        for policy in policies_to_delete:
-            try:
-                if self.remove_policy(policy.policy_name) and policy.delete():
-                    print(f"Policy {policy.policy_name} deleted successfully.")
-                else:
-                    print(f"Failed to delete policy {policy.policy_name}")
-            except Exception as e:
-                print(f"Error deleting policy {policy.policy_name}: {str(e)}")
-        
-        # Double-check if all policies were deleted
-        remaining_policies = self.get_policies()
-        if remaining_policies:
-            print(f"Warning: {len(remaining_policies)} policies could not be deleted.")
-            for policy in remaining_policies:
-                print(f"- {policy.policy_name}")
-        else:
-            print("All policies have been successfully deleted.")
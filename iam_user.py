@@ -1,14 +1,43 @@
-import boto3, json
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from clients import get_account_id, get_client
 from iam_policy import IAMPolicy
 
+logger = logging.getLogger(__name__)
+# Stay silent unless the application configures logging
+logger.addHandler(logging.NullHandler())
+
+# Upper bound on concurrent IAM calls, well inside the shared client's 50-connection pool
+MAX_WORKERS = 16
+
+# Access keys read from Parameter Store, keyed by parameter name
+ACCESS_KEYS_CACHE_TTL = 300
+_access_keys_cache = {}
+_access_keys_cache_lock = threading.Lock()
+
+def _cache_access_keys(parameter_name, access_keys):
+    with _access_keys_cache_lock:
+        _access_keys_cache[parameter_name] = (time.monotonic(), access_keys)
+
+def _cached_access_keys(parameter_name):
+    with _access_keys_cache_lock:
+        entry = _access_keys_cache.get(parameter_name)
+    if entry and time.monotonic() - entry[0] < ACCESS_KEYS_CACHE_TTL:
+        return entry[1]
+    return None
+
 class IAMUser:
     def __init__(self, username, create_user_if_required=False):
         self.username = username
-        self.iam_client = boto3.client('iam')
-        self.sts_client = boto3.client('sts')
-        self.account_id = self.sts_client.get_caller_identity()["Account"]
+        self.iam_client = get_client('iam')
         self.user = self._get_user()
-        self.policies = []
+        self._policies_by_name = {}
+        # ARN of every attached policy, including AWS managed ones that have no IAMPolicy
+        self._policy_arns = {}
         
         if self.user is None and create_user_if_required:
             self.create()
@@ -16,6 +45,14 @@ class IAMUser:
         if self.user:
             self._load_policies()
 
+    @cached_property
+    def account_id(self):
+        return get_account_id()
+
+    @property
+    def policies(self):
+        return list(self._policies_by_name.values())
+
     def _get_user(self):
         try:
             response = self.iam_client.get_user(UserName=self.username)
@@ -25,28 +62,56 @@ class IAMUser:
 
     def _load_policies(self):
         try:
-            response = self.iam_client.list_attached_user_policies(UserName=self.username)
-            for policy in response['AttachedPolicies']:
-                self.policies.append(IAMPolicy(policy['PolicyName']))
-        except Exception as e:
-            print(f"Error loading policies for user {self.username}: {str(e)}")
+            pages = self.iam_client.get_paginator('list_attached_user_policies').paginate(
+                UserName=self.username,
+                PaginationConfig={'PageSize': 1000}
+            )
+            attached = []
+            for page in pages:
+                for p in page['AttachedPolicies']:
+                    self._policy_arns[p['PolicyName']] = p['PolicyArn']
+                    # AWS managed policies are only ever detached, never read or changed
+                    if ':aws:policy/' not in p['PolicyArn']:
+                        attached.append(p)
+            by_name = {}
+            if len(attached) > MAX_WORKERS:
+                # Past one round of parallel GetPolicy calls, a single listing of the
+                # account's attached policies is cheaper than a GetPolicy per attachment
+                pages = self.iam_client.get_paginator('list_policies').paginate(
+                    Scope='Local',
+                    OnlyAttached=True,
+                    PaginationConfig={'PageSize': 1000}
+                )
+                by_name = {p['PolicyName']: p for page in pages for p in page['Policies']}
+            # Anything outside the snapshot needs its own GetPolicy, so fetch those in parallel
+            missing = [p['PolicyName'] for p in attached if p['PolicyName'] not in by_name]
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(missing) or 1)) as executor:
+                fetched = dict(zip(missing, executor.map(IAMPolicy, missing)))
+            for policy in attached:
+                name = policy['PolicyName']
+                if name in by_name:
+                    self._policies_by_name[name] = IAMPolicy.from_dict(by_name[name])
+                else:
+                    self._policies_by_name[name] = fetched[name]
+        except self.iam_client.exceptions.ClientError as e:
+            logger.error("Error loading policies for user %s: %s", self.username, e, exc_info=True)
 
     def create(self):
         if self.user is None:
             try:
                 response = self.iam_client.create_user(UserName=self.username)
                 self.user = response['User']
-                print(f"User {self.username} created successfully.")
-            except Exception as e:
-                print(f"Error creating user {self.username}: {str(e)}")
+                logger.info("User %s created successfully.", self.username)
+            except self.iam_client.exceptions.ClientError as e:
+                logger.error("Error creating user %s: %s", self.username, e, exc_info=True)
         else:
-            print(f"User {self.username} already exists.")
+            logger.warning("User %s already exists.", self.username)
 
     def read(self):
         if self.user:
             return self.user
         else:
-            print(f"User {self.username} does not exist.")
+            logger.warning("User %s does not exist.", self.username)
             return None
 
     def update(self, new_path=None, new_username=None):
@@ -60,29 +125,35 @@ class IAMUser:
 
                 response = self.iam_client.update_user(UserName=self.username, **update_params)
                 self.user = self._get_user()  # Refresh user info
-                print(f"User {self.username} updated successfully.")
+                logger.info("User %s updated successfully.", self.username)
                 if new_username:
                     self.username = new_username
-            except Exception as e:
-                print(f"Error updating user {self.username}: {str(e)}")
+            except self.iam_client.exceptions.ClientError as e:
+                logger.error("Error updating user %s: %s", self.username, e, exc_info=True)
         else:
-            print(f"User {self.username} does not exist.")
+            logger.warning("User %s does not exist.", self.username)
 
     def delete(self):
         if self.user:
             try:
                 # First, detach all policies
-                for policy in self.policies:
-                    self.remove_policy(policy.policy_name)
-                
+                policy_names = list(self._policy_arns)
+                with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(policy_names) or 1)) as executor:
+                    detached = list(executor.map(self.remove_policy, policy_names))
+                if not all(detached):
+                    # IAM refuses to delete a user that still has policies attached
+                    logger.error("Error deleting user %s: some policies could not be detached.", self.username)
+                    return
+
                 self.iam_client.delete_user(UserName=self.username)
                 self.user = None
-                self.policies = []
-                print(f"User {self.username} deleted successfully.")
-            except Exception as e:
-                print(f"Error deleting user {self.username}: {str(e)}")
+                self._policies_by_name.clear()
+                self._policy_arns.clear()
+                logger.info("User %s deleted successfully.", self.username)
+            except self.iam_client.exceptions.ClientError as e:
+                logger.error("Error deleting user %s: %s", self.username, e, exc_info=True)
         else:
-            print(f"User {self.username} does not exist.")
+            logger.warning("User %s does not exist.", self.username)
 
     def add_policy(self, policy_name, policy_document=None):
         if self.user:
@@ -90,9 +161,9 @@ class IAMUser:
             if not policy.policy:
                 # Create the policy if it doesn't exist
                 if policy_document:
-                    policy.create(policy_document)
+                    policy._create_unchecked(policy_document)
                 else:
-                    print(f"Policy {policy_name} does not exist and no policy document provided to create it.")
+                    logger.warning("Policy %s does not exist and no policy document provided to create it.", policy_name)
                     return
             
             if policy.policy:
@@ -101,126 +172,154 @@ class IAMUser:
                         UserName=self.username,
                         PolicyArn=policy.policy['Arn']
                     )
-                    self.policies.append(policy)
-                    print(f"Policy {policy_name} attached to user {self.username} successfully.")
-                except Exception as e:
-                    print(f"Error attaching policy {policy_name} to user {self.username}: {str(e)}")
+                    self._policies_by_name[policy_name] = policy
+                    self._policy_arns[policy_name] = policy.policy['Arn']
+                    logger.info("Policy %s attached to user %s successfully.", policy_name, self.username)
+                except self.iam_client.exceptions.ClientError as e:
+                    logger.error("Error attaching policy %s to user %s: %s", policy_name, self.username, e, exc_info=True)
+        else:
+            logger.warning("User %s does not exist.", self.username)
+
+    def add_managed_policy(self, policy_name, aws_managed=True):
+        # Attach by ARN directly, skipping the GetPolicy that add_policy does.
+        # Only the ARN is recorded (enough to detach it); a customer managed
+        # policy shows up in self.policies after the next load.
+        if not self.user:
+            logger.warning("User %s does not exist.", self.username)
+            return
+        if aws_managed:
+            policy_arn = f"arn:aws:iam::aws:policy/{policy_name}"
         else:
-            print(f"User {self.username} does not exist.")
+            policy_arn = f"arn:aws:iam::{self.account_id}:policy/{policy_name}"
+        try:
+            self.iam_client.attach_user_policy(
+                UserName=self.username,
+                PolicyArn=policy_arn
+            )
+            self._policy_arns[policy_name] = policy_arn
+            logger.info("Policy %s attached to user %s successfully.", policy_name, self.username)
+        except self.iam_client.exceptions.NoSuchEntityException:
+            logger.warning("Policy %s does not exist.", policy_arn)
+        except self.iam_client.exceptions.ClientError as e:
+            logger.error("Error attaching policy %s to user %s: %s", policy_name, self.username, e, exc_info=True)
 
     def remove_policy(self, policy_name):
         try:
-            policy_arn = f"arn:aws:iam::{self.account_id}:policy/{policy_name}"
+            policy_arn = self._policy_arns.get(policy_name) or f"arn:aws:iam::{self.account_id}:policy/{policy_name}"
             self.iam_client.detach_user_policy(
                 UserName=self.username,
                 PolicyArn=policy_arn
             )
-            print(f"Policy {policy_name} detached from user {self.username}")
-            self.policies = [p for p in self.policies if p.policy_name != policy_name]
+            logger.info("Policy %s detached from user %s", policy_name, self.username)
+            self._policies_by_name.pop(policy_name, None)
+            self._policy_arns.pop(policy_name, None)
             return True
-        except Exception as e:
-            print(f"Error detaching policy {policy_name} from user {self.username}: {str(e)}")
+        except self.iam_client.exceptions.ClientError as e:
+            logger.error("Error detaching policy %s from user %s: %s", policy_name, self.username, e, exc_info=True)
             return False
 
     def list_policies(self):
-        return [policy.policy_name for policy in self.policies]
+        return list(self._policies_by_name)
     
     def get_policies(self):
         return self.policies
     
+    def _delete_policy(self, policy):
+        # Detach and delete a single policy, returning whether both succeeded
+        try:
+            if not self.remove_policy(policy.policy_name):
+                return False
+            if policy.delete():
+                logger.info("Policy %s deleted successfully.", policy.policy_name)
+                return True
+            logger.error("Failed to delete policy %s", policy.policy_name)
+            return False
+        except Exception as e:
+            logger.error("Error processing policy %s: %s", policy.policy_name, e, exc_info=True)
+            return False
+
     def delete_all_policies(self):
-        policies_to_delete = self.policies.copy()
-        all_deleted = True
-        for policy in policies_to_delete:
-            try:
-                if self.remove_policy(policy.policy_name):
-                    if policy.delete():
-                        print(f"Policy {policy.policy_name} deleted successfully.")
-                    else:
-                        print(f"Failed to delete policy {policy.policy_name}")
-                        all_deleted = False
-                else:
-                    all_deleted = False
-            except Exception as e:
-                print(f"Error processing policy {policy.policy_name}: {str(e)}")
-                all_deleted = False
-        
+        policies_to_delete = self.policies
+        # Each policy is detached and deleted independently, so run them side by side
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(policies_to_delete) or 1)) as executor:
+            all_deleted = all(list(executor.map(self._delete_policy, policies_to_delete)))
+
         remaining_policies = self.get_policies()
         if remaining_policies:
-            print(f"Warning: {len(remaining_policies)} policies could not be deleted.")
+            logger.warning("%s policies could not be deleted.", len(remaining_policies))
             for policy in remaining_policies:
-                print(f"- {policy.policy_name}")
+                logger.warning("- %s", policy.policy_name)
         
         if all_deleted:
-            print("All policies have been successfully deleted.")
+            logger.info("All policies have been successfully deleted.")
         else:
-            print("Some policies could not be deleted. Please check the warnings above.")
+            logger.warning("Some policies could not be deleted. Please check the warnings above.")
+
+    def _create_access_key(self):
+        new_key = self.iam_client.create_access_key(UserName=self.username)['AccessKey']
+        return {
+            'AccessKeyId': new_key['AccessKeyId'],
+            'SecretAccessKey': new_key['SecretAccessKey']
+        }
+
+    def _store_access_keys(self, ssm_client, parameter_name, access_keys, overwrite=False):
+        ssm_client.put_parameter(
+            Name=parameter_name,
+            Value=json.dumps(access_keys),
+            Type='SecureString',
+            Overwrite=overwrite
+        )
+        _cache_access_keys(parameter_name, access_keys)
 
     def access_keys(self, rotate=False):
         # Get the AWS Systems Manager client
-        ssm_client = boto3.client('ssm')
+        ssm_client = get_client('ssm')
         parameter_name = f"/iam_user/{self.username}/access_keys"
 
         try:
-            # Try to retrieve existing access keys from Parameter Store
-            response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-            access_keys = json.loads(response['Parameter']['Value'])
-
-            if rotate:
-
-                # Deactivate the existing access key
-                self.iam_client.update_access_key(
-                    UserName=self.username,
-                    AccessKeyId=access_keys['AccessKeyId'],
-                    Status='Inactive'
-                )
-                print(f"Existing access key {access_keys['AccessKeyId']} deactivated for user {self.username}")
+            access_keys = _cached_access_keys(parameter_name)
+            if access_keys is None:
+                try:
+                    # Try to retrieve existing access keys from Parameter Store
+                    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
+                except ssm_client.exceptions.ParameterNotFound:
+                    # If no access keys exist, create new ones and store them
+                    new_access_keys = self._create_access_key()
+                    self._store_access_keys(ssm_client, parameter_name, new_access_keys)
+                    logger.info("New access keys created for user %s", self.username)
+                    return new_access_keys
 
-                # Delete the existing access key
-                self.iam_client.delete_access_key(
-                    UserName=self.username,
-                    AccessKeyId=access_keys['AccessKeyId']
-                )
-                print(f"Existing access key {access_keys['AccessKeyId']} deleted for user {self.username}")
-
-                # Create new access key
-                new_key = self.iam_client.create_access_key(UserName=self.username)['AccessKey']
-                
-                # Update Parameter Store with new access key
-                new_access_keys = {
-                    'AccessKeyId': new_key['AccessKeyId'],
-                    'SecretAccessKey': new_key['SecretAccessKey']
-                }
-                ssm_client.put_parameter(
-                    Name=parameter_name,
-                    Value=json.dumps(new_access_keys),
-                    Type='SecureString',
-                    Overwrite=True
-                )
+                access_keys = json.loads(response['Parameter']['Value'])
+                _cache_access_keys(parameter_name, access_keys)
 
-                print(f"Access keys rotated for user {self.username}")
-                return new_access_keys
-            else:
+            if not rotate:
                 return access_keys
 
-        except ssm_client.exceptions.ParameterNotFound:
-            # If no access keys exist, create new ones
-            new_key = self.iam_client.create_access_key(UserName=self.username)['AccessKey']
-            
-            # Store new access keys in Parameter Store
-            new_access_keys = {
-                'AccessKeyId': new_key['AccessKeyId'],
-                'SecretAccessKey': new_key['SecretAccessKey']
-            }
-            ssm_client.put_parameter(
-                Name=parameter_name,
-                Value=json.dumps(new_access_keys),
-                Type='SecureString'
+            # Deactivate the existing access key
+            self.iam_client.update_access_key(
+                UserName=self.username,
+                AccessKeyId=access_keys['AccessKeyId'],
+                Status='Inactive'
+            )
+            logger.info("Existing access key %s deactivated for user %s", access_keys['AccessKeyId'], self.username)
+
+            # Delete the existing access key
+            self.iam_client.delete_access_key(
+                UserName=self.username,
+                AccessKeyId=access_keys['AccessKeyId']
             )
+            logger.info("Existing access key %s deleted for user %s", access_keys['AccessKeyId'], self.username)
+
+            # Create the new key only once the old one is gone, so a failed delete leaves
+            # no untracked key behind (IAM allows just two per user)
+            new_access_keys = self._create_access_key()
+
+            # Update Parameter Store with new access key
+            self._store_access_keys(ssm_client, parameter_name, new_access_keys, overwrite=True)
 
-            print(f"New access keys created for user {self.username}")
+            logger.info("Access keys rotated for user %s", self.username)
             return new_access_keys
 
         except Exception as e:
-            print(f"Error managing access keys for user {self.username}: {str(e)}")
+            logger.error("Error managing access keys for user %s: %s", self.username, e, exc_info=True)
             return None
@@ -1,12 +1,26 @@
-import boto3
+import json
+import time
+from functools import lru_cache
+from pathlib import Path
+from clients import get_account_id, get_client
 
-class Regions:
-    def __init__(self):
-        return self.list()
+# Enabled regions rarely change, so keep them on disk between runs
+CACHE_DIR = Path.home() / ".cache" / "bedrock-key-gen"
+CACHE_TTL = 24 * 60 * 60
 
+class Regions:
     @staticmethod
+    @lru_cache(maxsize=1)
     def list():
-        ec2 = boto3.client('ec2')
+        # Enabled regions differ per account, so cache them per account
+        cache_file = CACHE_DIR / f"regions-{get_account_id()}.json"
+        try:
+            if time.time() - cache_file.stat().st_mtime < CACHE_TTL:
+                return json.loads(cache_file.read_text())
+        except (OSError, ValueError):
+            pass
+
+        ec2 = get_client('ec2')
         response = ec2.describe_regions()
         regions = [
             {
@@ -16,4 +30,11 @@ class Regions:
             for region in response['Regions']
         ]
         # Sort the regions list based on the 'label' key
-        return sorted(regions, key=lambda x: x['label'])
+        regions = sorted(regions, key=lambda x: x['label'])
+
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(json.dumps(regions))
+        except OSError:
+            pass
+        return regions
@@ -1,19 +1,36 @@
-import boto3
-import json
+import curses
+import logging
 import secrets
-import string
-from iam_user import IAMUser
+import sys
+import threading
+from clients import get_caller_identity
+from iam_user import IAMUser, MAX_WORKERS
 from iam_policy import IAMPolicy
 from regions import Regions
 from bedrock import Bedrock
 from tree_menu import TreeMenu
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+MENU_OPTIONS = [
+    "Create access policy for Bedrock model access",
+    "List access policies for Bedrock model access",
+    "Rotate access keys",
+    "DELETE ALL POLICIES NOW",
+    "Exit"
+]
+
+DURATION_OPTIONS = [
+    {'label': '1 hour', 'value': 1*60*60},
+    {'label': '6 hours', 'value': 6*60*60},
+    {'label': '12 hours', 'value': 12*60*60},
+    {'label': '24 hours', 'value': 24*60*60}
+]
+
 def get_session_user():
     try:
-        sts_client = boto3.client('sts')
-        response = sts_client.get_caller_identity()
-        
+        response = get_caller_identity()
+
         # Extract the user or role name from the ARN
         arn = response['Arn']
         name = arn.split('/')[-1]
@@ -23,23 +40,50 @@ def get_session_user():
         print(f"Error getting session user: {str(e)}")
         return None
 
+def _in_background(fn, *args):
+    # Run fn on a daemon thread and return a Future for its result. Unlike executor
+    # workers, daemon threads aren't joined at exit, so quitting early never waits on it.
+    future = Future()
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+class _MessageFormatter(logging.Formatter):
+    # The modules attach tracebacks to their error logs; the CLI shows just the message
+    def formatException(self, exc_info):
+        return ""
+
+    def formatStack(self, stack_info):
+        return ""
+
 def main():
+    # The IAM and Bedrock modules report progress through logging; show it like regular output.
+    # Only their loggers get the handler, so botocore's own INFO records stay quiet.
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(_MessageFormatter("%(message)s"))
+    for name in ("iam_user", "iam_policy", "bedrock"):
+        module_logger = logging.getLogger(name)
+        module_logger.setLevel(logging.INFO)
+        module_logger.addHandler(handler)
+
     print("Bedrock Developer Tool")
     print("Checking session user...")
     session_user = get_session_user()
     print(f"Session user: {session_user}")
+
+    # Fetch the region list while the IAM user loads and the main menu is shown;
+    # choosing anything else just abandons it
+    regions_future = _in_background(Regions.list)
+
     print("Getting IAM user...")
     bedrock_developer_user = IAMUser(f"bedrock-developer-{session_user}", create_user_if_required=True)
 
-    menu_options = [
-        "Create access policy for Bedrock model access",
-        "List access policies for Bedrock model access",
-        "Rotate access keys",
-        "DELETE ALL POLICIES NOW",
-        "Exit"
-    ]
     menu = TreeMenu(
-        [{"label": option, "value": option} for option in menu_options],
+        [{"label": option, "value": option} for option in MENU_OPTIONS],
         include_all=False,
         title="Bedrock Developer Tool",
         question="Select an option:",
@@ -48,7 +92,7 @@ def main():
     selected_option = menu.run()[0]
 
     if selected_option == "Create access policy for Bedrock model access":
-        create_access_policy(bedrock_developer_user, session_user)
+        create_access_policy(bedrock_developer_user, session_user, regions_future.result())
     elif selected_option == "List access policies for Bedrock model access":
         list_access_policies(bedrock_developer_user)
     elif selected_option == "Rotate access keys":
@@ -58,57 +102,70 @@ def main():
     elif selected_option == "Exit":
         print("Exiting the application. Goodbye!")
 
-def create_access_policy(bedrock_developer_user, session_user):
-    # Get the list of regions
-    regions = Regions.list()
+def create_access_policy(bedrock_developer_user, session_user, regions=None):
+    # Get the list of regions, unless the caller already has it
+    if regions is None:
+        regions = Regions.list()
     region_menu = TreeMenu(regions, include_all=False, title="AWS Regions", question="Select a region:", single_select=True)
-    selected_region = region_menu.run()[0]
-    
+    duration_menu = TreeMenu(DURATION_OPTIONS, include_all=False, title="Session Duration", question="Select the duration for the temporary credentials:", single_select=True)
+
+    def choose(stdscr):
+        # Run all three menus on one curses screen rather than setting the terminal up for each
+        selected_region = region_menu.run(stdscr)[0]
+        if not selected_region:
+            return None, None, None, None
+
+        # Start listing the Bedrock models for the region in the background so the
+        # request overlaps with the user picking a duration.
+        bedrock = Bedrock(region=selected_region)
+        models_future = _in_background(bedrock.fetch_foundation_models)
+
+        selected_duration = duration_menu.run(stdscr)
+        if not selected_duration:
+            return selected_region, None, None, None
+
+        # Select Bedrock models. Any error is handed back rather than printed, since
+        # output written now would garble the menu and be wiped when curses exits.
+        foundation_models, models_error = models_future.result()
+        if foundation_models is None:
+            return selected_region, selected_duration, None, models_error
+
+        model_menu = TreeMenu(
+            foundation_models,
+            include_all=True,
+            title=f"Region: {selected_region[0]}",
+            question="Select one or more foundation models:"
+        )
+        return selected_region, selected_duration, model_menu.run(stdscr), None
+
+    selected_region, selected_duration, selected_models, models_error = curses.wrapper(choose)
+
     if not selected_region:
         print("No region selected. Exiting.")
         return
 
-    duration_options = [
-        {'label': '1 hour', 'value': 1*60*60},
-        {'label': '6 hours', 'value': 6*60*60},
-        {'label': '12 hours', 'value': 12*60*60},
-        {'label': '24 hours', 'value': 24*60*60}
-    ]
-
-    duration_menu = TreeMenu(duration_options, include_all=False, title="Session Duration", question="Select the duration for the temporary credentials:", single_select=True)
-    selected_duration = duration_menu.run()
-
     if not selected_duration:
         print("No duration selected. Exiting.")
         return
 
     duration_seconds = selected_duration[0]
 
-    # Initialize Bedrock with the selected region
-    bedrock = Bedrock(region=selected_region)
-
-    # Select Bedrock models
-    foundation_models = bedrock.foundation_models()
-    if foundation_models is None:
+    if selected_models is None:
+        if models_error:
+            print(f"\n{models_error}")
         print("Exiting due to Bedrock unavailability.")
         return
-
-    model_menu = TreeMenu(
-        foundation_models,
-        include_all=True,
-        title=f"Region: {selected_region[0]}",
-        question="Select one or more foundation models:"
-    )
-    selected_models = model_menu.run()
     
     print(f"\nSelected region: {selected_region[0]}")
-    print(f"Selected model ARNs:\n-",  '\n- '.join(selected_models))
+    sys.stdout.write("Selected model ARNs:\n")
+    sys.stdout.writelines(f"- {model}\n" for model in selected_models)
 
     # Use datetime.now() with UTC timezone
     current_time = datetime.now(timezone.utc)
     expiration_time = current_time + timedelta(seconds=duration_seconds)
 
-    policy_document = json.dumps({
+    expires_at = expiration_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    policy_document = {
         "Version": "2012-10-17",
         "Statement": [{
             "Effect": "Allow",
@@ -116,14 +173,14 @@ def create_access_policy(bedrock_developer_user, session_user):
             "Resource": selected_models,
             "Condition": {
                 "DateLessThan": {
-                    "aws:CurrentTime": expiration_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+                    "aws:CurrentTime": expires_at
                 }
             }
         }]
-    })
+    }
 
-    # Generate a short random string (e.g., 8 characters)
-    random_suffix = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(8))
+    # Generate a short random string (8 hex characters)
+    random_suffix = secrets.token_hex(4)
 
     bedrock_developer_user.add_policy(
         f"bedrock-dev-{session_user}-{random_suffix}",
@@ -153,9 +210,12 @@ def display_access_keys(access_keys):
 def list_access_policies(bedrock_developer_user):
     policies = bedrock_developer_user.get_policies()
     print("\nBedrock Access Policies:")
-    for p in policies:
-        policy = IAMPolicy(p.policy_name)
-        print(policy.summary())
+    if not policies:
+        return
+    # Each summary fetches its policy document, so build them in parallel and print in order
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(policies))) as executor:
+        summaries = list(executor.map(IAMPolicy.summary, policies))
+    print("\n".join(summaries))
 
 def rotate_access_keys(bedrock_developer_user):
     confirm = input("Are you sure you want to rotate access keys? (y/n): ")
@@ -1,148 +1,315 @@
 import curses
 from collections import defaultdict
 
+# Looked up once here rather than through the curses module on every key and row
+_A_NORMAL = curses.A_NORMAL
+_A_REVERSE = curses.A_REVERSE
+_KEY_RESIZE = curses.KEY_RESIZE
+_KEY_UP = curses.KEY_UP
+_KEY_DOWN = curses.KEY_DOWN
+_KEY_LEFT = curses.KEY_LEFT
+_KEY_RIGHT = curses.KEY_RIGHT
+_SPACE = ord(' ')
+_ENTER = ord('\n')
+
 class TreeMenu:
     def __init__(self, items, include_all=True, title=None, question=None, single_select=False):
-        self.providers = defaultdict(list)
-        self.use_groups = False
         self.include_all = include_all
         self.title = title
         self.question = question
         self.single_select = single_select
         self.items = items
+        # The header and footer never change, so display() only draws them on a fresh screen
+        self._header_rows = bool(title) + bool(question)
+        if single_select:
+            self._footer = "↑↓: Move, Enter: Select"
+        else:
+            self._footer = "↑↓: Move, →←: Expand/Collapse, Space: Select, Enter: Confirm"
+        # Group the items and detect whether grouping is in use in a single pass
+        self.use_groups = False
+        self.providers = {}
         for item in items:
             if 'groupName' in item:
                 self.use_groups = True
-                self.providers[item['groupName']].append(item)
+                group = item['groupName']
             else:
-                self.providers[''].append(item)
-        self.menu_items = list(self.providers.keys()) if self.use_groups else self.providers['']
-        self.expanded = set()
+                group = ''
+            self.providers.setdefault(group, []).append(item)
+        # Show groups in a stable alphabetical order rather than whatever order the API returned
+        self.menu_items = sorted(self.providers) if self.use_groups else self.providers.get('', [])
+        # What "All" and each group select, built once so toggling them is plain set algebra
+        self._all_values = frozenset(item['value'] for item in items)
+        self._all_groups = frozenset(self.providers)
+        self._group_values = {group: frozenset(model['value'] for model in models) for group, models in self.providers.items()}
+        # Each group's model rows are the same every time it's expanded, so build them once
+        self._provider_block = {group: [('model', model) for model in models] for group, models in self.providers.items()}
+        # Expanded groups are a bitmask over these ids rather than a set of names
+        self._provider_ids = {name: i for i, name in enumerate(self.providers)}
+        self.expanded = 0
         self.current_selection = 0
         self.top_line = 0
-        self.selected_items = set()
+        if single_select:
+            # Single-select only ever holds one value, so keep it as a scalar
+            self._single_selected = None
+        else:
+            self.selected_items = set()
         self.selected_groups = set()
+        # How many of each group's models are selected, so group state updates in O(1)
+        self._group_selected_count = defaultdict(int)
+        # The flattened menu only changes shape when a group is expanded or collapsed
+        self._flat_menu_cache = None
+        self._flat_menu_len = 0
+        # Bumped whenever the menu's shape or selection changes, so display() can tell a frame is unchanged
+        self._flat_menu_version = 0
+        self._selected_version = 0
+        self._render_sig = None
+        # Rows as last drawn, so display() can skip the ones that haven't changed
+        self._last_rendered = None
+        # Truncation limits for each kind of row, worked out again only when the width changes
+        self._last_width = None
+        # Finished row labels by (row type, text, selected, expanded); cleared when the width changes
+        self._label_cache = {}
+
+    def _invalidate_flat_menu(self):
+        self._flat_menu_cache = None
+        self._flat_menu_version += 1
 
     def get_flat_menu(self):
-        flat_menu = []
+        if self._flat_menu_cache is not None:
+            return self._flat_menu_cache
+        # The final size is known up front, so allocate once and fill by index
+        size = len(self.menu_items) + bool(self.include_all)
+        if self.use_groups:
+            size += sum(len(self.providers[provider]) for provider in self.menu_items if self._is_expanded(provider))
+        flat_menu = [None] * size
+        i = 0
         if self.include_all:
-            flat_menu.append(('all', {'label': 'All', 'value': '*'}))
+            flat_menu[i] = ('all', {'label': 'All', 'value': '*'})
+            i += 1
         if self.use_groups:
             for provider in self.menu_items:
-                flat_menu.append(('provider', provider))
-                if provider in self.expanded:
-                    for model in self.providers[provider]:
-                        flat_menu.append(('model', model))
+                flat_menu[i] = ('provider', provider)
+                i += 1
+                if self._is_expanded(provider):
+                    block = self._provider_block[provider]
+                    flat_menu[i:i + len(block)] = block
+                    i += len(block)
         else:
-            for item in self.menu_items:
-                flat_menu.append(('model', item))
+            flat_menu[i:] = self._provider_block.get('', [])
+        self._flat_menu_cache = flat_menu
+        self._flat_menu_len = len(flat_menu)
         return flat_menu
 
+    def _all_selected(self):
+        return bool(self.selected_items) and len(self.selected_items) == len(self._all_values)
+
+    def _is_expanded(self, provider):
+        return bool(self.expanded & (1 << self._provider_ids[provider]))
+
+    def _current_item(self):
+        return self.get_flat_menu()[self.current_selection]
+
+    def _visible_rows(self):
+        return max(self._height - self._header_rows - 1, 0)
+
+    def _scroll_to_selection(self):
+        visible_rows = max(self._visible_rows(), 1)
+        if self.current_selection < self.top_line:
+            self.top_line = self.current_selection
+        elif self.current_selection >= self.top_line + visible_rows:
+            self.top_line = self.current_selection - visible_rows + 1
+
+    def _on_resize(self, width):
+        self._last_width = width
+        self._w_title = width - 1
+        self._w_provider = width - 4
+        self._w_provider_name = max(width - 7, 0)
+        self._w_model = width - 8
+        self._label_cache.clear()
+
+    def _row_label(self, item_type, text, selected, expanded):
+        # A row's label only depends on these, so each variant is formatted once per width
+        key = (item_type, text, selected, expanded)
+        label = self._label_cache.get(key)
+        if label is None:
+            selection_indicator = '*' if selected else ' '
+            if item_type == 'provider':
+                prefix = '▼ ' if expanded else '▶ '
+                label = (f"{selection_indicator}{prefix}" + text[:self._w_provider_name])[:self._w_provider]
+            else:
+                label = f"{selection_indicator} {text[:self._w_model]}"
+                if self.use_groups and item_type != 'all':
+                    label = f"    {label}"
+            self._label_cache[key] = label
+        return label
+
     def display(self, stdscr):
-        stdscr.clear()
-        height, width = stdscr.getmaxyx()
-        
-        y = 0
-        if self.title:
-            stdscr.addstr(y, 0, self.title[:width-1])
-            y += 1
-        if self.question:
-            stdscr.addstr(y, 0, self.question[:width-1])
-            y += 1
+        height, width = self._height, self._width
+        render_sig = (height, width, self.top_line, self.current_selection, self._flat_menu_version, self._selected_version)
+        if self._last_rendered is not None and render_sig == self._render_sig:
+            return
+        self._render_sig = render_sig
+        if width != self._last_width:
+            self._on_resize(width)
+        # Build the menu rows as {row: (x, text, attr)} and only write rows that changed
+        rows = {}
         
         flat_menu = self.get_flat_menu()
-        max_display = height - y - 1
+        max_display = self._visible_rows()
         
-        for i in range(max_display):
-            item_index = self.top_line + i
-            if item_index >= len(flat_menu):
-                break
-            
-            item_type, item = flat_menu[item_index]
-            y_pos = y + i
-            x = 2
-            
+        row_offset = self._header_rows - self.top_line
+        for item_index, (item_type, item) in enumerate(flat_menu[self.top_line:self.top_line + max_display], start=self.top_line):
             if item_type == 'provider':
-                prefix = '▼ ' if item in self.expanded else '▶ '
-                selection_indicator = '*' if item in self.selected_groups else ' '
-                label = f"{selection_indicator}{prefix}{item}"[:width-4]
+                label = self._row_label(item_type, item, item in self.selected_groups, self._is_expanded(item))
             else:
-                label = item['label'][:width-8]
                 if self.single_select:
-                    selection_indicator = '*' if item['value'] == self.selected_items else ' '
+                    selected = item['value'] == self._single_selected
+                elif item_type == 'all':
+                    selected = self._all_selected()
                 else:
-                    selection_indicator = '*' if item['value'] in self.selected_items else ' '
-                label = f"{selection_indicator} {label}"
-                if self.use_groups and item_type != 'all':
-                    label = f"    {label}"
+                    selected = item['value'] in self.selected_items
+                label = self._row_label(item_type, item['label'], selected, False)
             
-            if item_index == self.current_selection:
-                stdscr.attron(curses.A_REVERSE)
-                stdscr.addstr(y_pos, x, label)
-                stdscr.attroff(curses.A_REVERSE)
-            else:
-                stdscr.addstr(y_pos, x, label)
-        
-        if self.single_select:
-            stdscr.addstr(height-1, 0, "↑↓: Move, Enter: Select")
-        else:
-            stdscr.addstr(height-1, 0, "↑↓: Move, →←: Expand/Collapse, Space: Select, Enter: Confirm")
-        stdscr.refresh()
+            attr = _A_REVERSE if item_index == self.current_selection else _A_NORMAL
+            rows[row_offset + item_index] = (2, label, attr)
+
+        changed = False
+        if self._last_rendered is None:
+            # First frame on this screen (or after a resize): start from a blank screen
+            # and draw the parts that stay put until the next one
+            stdscr.clear()
+            y = 0
+            for text in (self.title, self.question):
+                if text:
+                    stdscr.addstr(y, 0, text[:self._w_title], _A_NORMAL)
+                    y += 1
+            stdscr.addstr(height-1, 0, self._footer[:self._w_title], _A_NORMAL)
+            self._last_rendered = {}
+            changed = True
+        for row in rows.keys() | self._last_rendered.keys():
+            if rows.get(row) == self._last_rendered.get(row):
+                continue
+            stdscr.move(row, 0)
+            stdscr.clrtoeol()
+            if row in rows:
+                x, text, attr = rows[row]
+                stdscr.addstr(row, x, text, attr)
+            changed = True
+        self._last_rendered = rows
+        if changed:
+            # Stage the window and push it to the terminal in one write
+            stdscr.noutrefresh()
+            curses.doupdate()
+
+    def _handle_key(self, stdscr, key):
+        # Apply one key to the menu state; returns (changed, result), where result ends the menu
+        changed = False
+
+        if key == _KEY_RESIZE:
+            self._height, self._width = stdscr.getmaxyx()
+            self._last_rendered = None
+            self._scroll_to_selection()
+            changed = True
+        elif key == _KEY_UP and self.current_selection > 0:
+            self.current_selection -= 1
+            self._scroll_to_selection()
+            changed = True
+        elif key == _KEY_DOWN:
+            # An earlier key in this batch may have expanded or collapsed a group since the last redraw
+            if self._flat_menu_cache is None:
+                self.get_flat_menu()
+            if self.current_selection < self._flat_menu_len - 1:
+                self.current_selection += 1
+                self._scroll_to_selection()
+                changed = True
+        elif key == _KEY_RIGHT and not self.single_select:
+            item_type, item = self._current_item()
+            if item_type == 'provider' and not self._is_expanded(item):
+                self.expanded |= 1 << self._provider_ids[item]
+                self._invalidate_flat_menu()
+                changed = True
+        elif key == _KEY_LEFT and not self.single_select:
+            item_type, item = self._current_item()
+            if item_type == 'provider' and self._is_expanded(item):
+                self.expanded &= ~(1 << self._provider_ids[item])
+                self._invalidate_flat_menu()
+                changed = True
+        elif key == _SPACE and not self.single_select:
+            item_type, item = self._current_item()
+            self._selected_version += 1
+            changed = True
+            if item_type == 'model':
+                group = item.get('groupName', '')
+                if item['value'] in self.selected_items:
+                    self.selected_items.remove(item['value'])
+                    self._group_selected_count[group] -= 1
+                else:
+                    self.selected_items.add(item['value'])
+                    self._group_selected_count[group] += 1
+                # A group is selected exactly when all of its models are
+                if self._group_selected_count[group] == len(self.providers[group]):
+                    self.selected_groups.add(group)
+                else:
+                    self.selected_groups.discard(group)
+            elif item_type == 'provider':
+                if item in self.selected_groups:
+                    self.selected_groups.remove(item)
+                    self.selected_items -= self._group_values[item]
+                    self._group_selected_count[item] = 0
+                else:
+                    self.selected_groups.add(item)
+                    self.selected_items |= self._group_values[item]
+                    self._group_selected_count[item] = len(self.providers[item])
+            elif item_type == 'all':
+                if self._all_selected():
+                    self.selected_items.clear()
+                    self.selected_groups.clear()
+                    self._group_selected_count.clear()
+                else:
+                    self.selected_items = set(self._all_values)
+                    self.selected_groups = set(self._all_groups)
+                    for group, models in self.providers.items():
+                        self._group_selected_count[group] = len(models)
+        elif key == _ENTER:
+            if self.single_select:
+                item_type, item = self._current_item()
+                if item_type == 'model':
+                    self._single_selected = item['value']
+                    self._selected_version += 1
+                    return True, [item['value']]
+            elif self.selected_items:
+                return changed, list(self.selected_items)
+        return changed, None
 
     def _run_menu(self, stdscr):
         curses.curs_set(0)  # Hide the cursor
+        # Terminal size only changes on KEY_RESIZE, so don't query it every frame
+        self._height, self._width = stdscr.getmaxyx()
+        self._last_rendered = None
         self.display(stdscr)
 
         while True:
+            stdscr.timeout(-1)
             key = stdscr.getch()
-            flat_menu = self.get_flat_menu()
-            
-            if key == curses.KEY_UP and self.current_selection > 0:
-                self.current_selection -= 1
-                if self.current_selection < self.top_line:
-                    self.top_line = self.current_selection
-            elif key == curses.KEY_DOWN and self.current_selection < len(flat_menu) - 1:
-                self.current_selection += 1
-                if self.current_selection >= self.top_line + curses.LINES - 3:
-                    self.top_line = self.current_selection - curses.LINES + 4
-            elif key == curses.KEY_RIGHT and not self.single_select:
-                if flat_menu[self.current_selection][0] == 'provider':
-                    self.expanded.add(flat_menu[self.current_selection][1])
-            elif key == curses.KEY_LEFT and not self.single_select:
-                if flat_menu[self.current_selection][0] == 'provider':
-                    self.expanded.discard(flat_menu[self.current_selection][1])
-            elif key == ord(' ') and not self.single_select:
-                item_type, item = flat_menu[self.current_selection]
-                if item_type == 'model':
-                    if item['value'] in self.selected_items:
-                        self.selected_items.remove(item['value'])
-                    else:
-                        self.selected_items.add(item['value'])
-                elif item_type == 'provider':
-                    if item in self.selected_groups:
-                        self.selected_groups.remove(item)
-                        for model in self.providers[item]:
-                            self.selected_items.discard(model['value'])
-                    else:
-                        self.selected_groups.add(item)
-                        for model in self.providers[item]:
-                            self.selected_items.add(model['value'])
-                elif item_type == 'all':
-                    if len(self.selected_items) == len(self.items):
-                        self.selected_items.clear()
-                        self.selected_groups.clear()
-                    else:
-                        self.selected_items = set(item['value'] for item in self.items)
-                        self.selected_groups = set(self.providers.keys())
-            elif key == ord('\n'):  # Enter key
-                if self.single_select:
-                    item_type, item = flat_menu[self.current_selection]
-                    if item_type == 'model':
-                        return [item['value']]
-                elif self.selected_items:
-                    return list(self.selected_items)
-            
-            self.display(stdscr)
+            # Apply every key that's already queued (key repeat, pasted arrows) before drawing once;
+            # stray keys and -1 cost nothing
+            changed = False
+            stdscr.timeout(0)
+            while key != -1:
+                key_changed, result = self._handle_key(stdscr, key)
+                if result is not None:
+                    # Leave the final state (e.g. the single-select marker) on screen while the
+                    # caller carries on, rather than whatever was drawn before this batch
+                    self.display(stdscr)
+                    stdscr.timeout(-1)
+                    return result
+                changed = changed or key_changed
+                key = stdscr.getch()
+            if changed:
+                self.display(stdscr)
 
-    def run(self):
+    def run(self, stdscr=None):
+        # Reuse a screen the caller already set up, e.g. for several menus in a row
+        if stdscr is not None:
+            return self._run_menu(stdscr)
         return curses.wrapper(self._run_menu)